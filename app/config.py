@@ -3,3 +3,12 @@ import os
 ENGINE_URL = os.getenv("ENGINE_URL", "https://cscratch-171510694317.us-central1.run.app")
 INTERNAL_API_KEY = os.getenv("INTERNAL_API_KEY", "local-dev-secret")
 DISCORD_TOKEN = os.getenv("DISCORD_TOKEN", "badtoken")
+
+# "json" or "msgpack"; the Engine must accept the matching Content-Type
+ENGINE_WIRE_FORMAT = os.getenv("ENGINE_WIRE_FORMAT", "json")
+
+# Coalesce message forwards into /ingress/batch POSTs; only enable once the Engine serves that route
+ENGINE_BATCH_MESSAGES = os.getenv("ENGINE_BATCH_MESSAGES", "false").lower() in ("1", "true", "yes")
+
+# Comma-separated custom_id prefixes the Engine handles; empty forwards every component interaction
+COMPONENT_ID_PREFIXES = tuple(p for p in os.getenv("COMPONENT_ID_PREFIXES", "").split(",") if p)
\ No newline at end of file
@@ -2,27 +2,129 @@ import discord
 import logging
 import aiohttp
 import asyncio
+import random
+from functools import partial
+import orjson
+import msgpack
+from yarl import URL
 from discord import app_commands
 from discord.ext import commands
 from . import config
+from .payloads import CommandContext, CommandPayload, MessagePayload, InteractionPayload, to_dict
 
-# Logging setup
-logging.basicConfig(level=logging.INFO)
+# Logging is configured once by the app entrypoint (app/main.py)
 logger = logging.getLogger("gateway")
 
+# With ENGINE_BATCH_MESSAGES on, message forwards are coalesced into one /ingress/batch POST per window
+BATCH_MAX_EVENTS = 32
+BATCH_LINGER_SECONDS = 0.02
+BATCH_QUEUE_MAX = 10_000
+
+# Events the guild_messages/dm_messages intents deliver but nothing here consumes;
+# their discord.py parsers are replaced with a no-op. Only list events the current
+# intents actually send, so widening intents later never silently swallows events.
+IGNORED_GATEWAY_EVENTS = (
+    "MESSAGE_UPDATE",
+    "MESSAGE_DELETE",
+    "MESSAGE_DELETE_BULK",
+)
+
+# Component interactions outside these custom_id namespaces are ignored before defer
+COMPONENT_ID_PREFIXES = config.COMPONENT_ID_PREFIXES
+
+# Every event type the gateway forwards; their ingress URLs are built once in setup_hook
+INGRESS_EVENT_TYPES = ("command", "interaction", "message", "batch")
+
+# Engine POSTs are drained by fixed worker pools; together they match limit_per_host.
+# Commands/interactions are already deferred, so they get their own queue and workers
+# and are never dropped behind message traffic.
+INTERACTION_EVENT_TYPES = frozenset(("command", "interaction"))
+ENGINE_WORKERS = 48
+ENGINE_QUEUE_MAX = 10_000
+INTERACTION_WORKERS = 16
+INTERACTION_QUEUE_MAX = 1_000
+
+# Overload warnings for dropped events are logged at most once per interval
+DROP_LOG_INTERVAL_SECONDS = 5
+
+# After this many forwards in a row exhaust their retries, drop new events for a cooldown
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_COOLDOWN_SECONDS = 30
+
+# Per-attempt Engine POST timeout; aiohttp's 5 minute default would stall the breaker and the workers
+ENGINE_TIMEOUT = aiohttp.ClientTimeout(total=10, connect=3)
+
 class GatewayBot(commands.Bot):
     def __init__(self):
-        # Gateway needs intent to see messages to forward them
-        intents = discord.Intents.default()
+        # Subscribe only to what gets forwarded: guild/DM messages with content.
+        # Interactions arrive regardless of intents. Author/user names are in the event
+        # payloads, so no members intent and no member chunking on connect.
+        intents = discord.Intents.none()
+        intents.guilds = True
+        intents.guild_messages = True
+        intents.dm_messages = True
         intents.message_content = True
-        intents.members = True # Needed to get user names/avatars reliably
-        super().__init__(command_prefix="!", intents=intents)
+        # MESSAGE_CREATE is parsed by _forward_raw_message, so the message cache would never fill
+        super().__init__(command_prefix="!", intents=intents, chunk_guilds_at_startup=False, max_messages=None)
         
         self.http_session = None
+        self._headers = None
+        self._ingress_urls = {}
+        self._encode = orjson.dumps
+        self._tx_queue = None
+        self._interaction_queue = None
+        self._tx_workers = []
+        self._tx_dropped = 0
+        self._tx_drop_logged_at = 0.0
+        self._batch_queue = None
+        self._batch_task = None
+        self._cb_failures = 0
+        self._cb_open_until = 0.0
+        # Plain flag for the /ping healthcheck, flipped by the connection events below
+        self.gateway_connected = False
 
     async def setup_hook(self):
 
-        self.http_session = aiohttp.ClientSession()
+        # Every POST goes to the single Engine host, so keep a warm keep-alive pool
+        # and cache its DNS entry instead of reconnecting per event
+        connector = aiohttp.TCPConnector(
+            limit=256,
+            limit_per_host=64,
+            keepalive_timeout=75,
+            ttl_dns_cache=300,
+            enable_cleanup_closed=True
+        )
+        self.http_session = aiohttp.ClientSession(connector=connector, timeout=ENGINE_TIMEOUT)
+
+        # Both encoders return bytes, so the body goes straight onto the wire
+        if config.ENGINE_WIRE_FORMAT == "msgpack":
+            self._encode = partial(msgpack.packb, default=to_dict)
+            content_type = "application/msgpack"
+        else:
+            self._encode = orjson.dumps
+            content_type = "application/json"
+
+        self._headers = {
+            "Content-Type": content_type,
+            "X-Internal-Auth": config.INTERNAL_API_KEY
+        }
+
+        # Prebuilt yarl URLs so aiohttp doesn't reformat and reparse one per POST
+        self._ingress_urls = {
+            event_type: URL(f"{config.ENGINE_URL}/ingress/{event_type}")
+            for event_type in INGRESS_EVENT_TYPES
+        }
+
+        self._tx_queue = asyncio.Queue(maxsize=ENGINE_QUEUE_MAX)
+        self._interaction_queue = asyncio.Queue(maxsize=INTERACTION_QUEUE_MAX)
+        self._tx_workers = (
+            [asyncio.create_task(self._tx_worker(self._tx_queue)) for _ in range(ENGINE_WORKERS)]
+            + [asyncio.create_task(self._tx_worker(self._interaction_queue)) for _ in range(INTERACTION_WORKERS)]
+        )
+
+        if config.ENGINE_BATCH_MESSAGES:
+            self._batch_queue = asyncio.Queue(maxsize=BATCH_QUEUE_MAX)
+            self._batch_task = asyncio.create_task(self._batch_worker())
         
         # Add Command Groups/Trees
         self.tree.add_command(cscratch_group)
@@ -31,48 +133,172 @@ class GatewayBot(commands.Bot):
         await self.tree.sync()
 
     async def on_ready(self):
-        logger.info(f"Gateway Online: {self.user} (ID: {self.user.id})")
-        logger.info(f"Forwarding targets to: {config.ENGINE_URL}")
+        logger.info("Gateway Online: %s (ID: %s)", self.user, self.user.id)
+        logger.info("Forwarding targets to: %s", config.ENGINE_URL)
+        self.gateway_connected = True
+
+    async def on_resumed(self):
+        self.gateway_connected = True
+
+    async def on_disconnect(self):
+        self.gateway_connected = False
 
     async def close(self):
+        self.gateway_connected = False
+        if self._batch_task:
+            self._batch_task.cancel()
+        for worker in self._tx_workers:
+            worker.cancel()
         if self.http_session:
             await self.http_session.close()
         await super().close()
 
-    async def forward_event(self, event_type: str, payload: dict):
+    def forward_event(self, event_type: str, payload):
         """
         Fire-and-forget POST to the Engine.
         """
-        if not self.http_session:
+        if not self.can_forward():
             return
 
-        headers = {
-            "Content-Type": "application/json",
-            "X-Internal-Auth": config.INTERNAL_API_KEY
-        }
+        self.enqueue_event(event_type, payload)
+
+    def enqueue_event(self, event_type: str, payload):
+        """
+        forward_event without the guard, for callers that already checked can_forward().
+        """
+        # Hand off to a worker pool so the Gateway event loop never waits on the Engine
+        queue = self._interaction_queue if event_type in INTERACTION_EVENT_TYPES else self._tx_queue
+        try:
+            queue.put_nowait((event_type, payload))
+        except asyncio.QueueFull:
+            self._count_drop(event_type)
+
+    def forward_batched(self, event_type: str, payload):
+        """
+        Queue an event for the next /ingress/batch POST.
+        Only for events where a few ms of extra latency is harmless (not interaction ACKs).
+        Falls back to a direct forward while ENGINE_BATCH_MESSAGES is off.
+        """
+        if not self.can_forward():
+            return
+
+        self.enqueue_batched(event_type, payload)
+
+    def enqueue_batched(self, event_type: str, payload):
+        """
+        forward_batched without the guard, for callers that already checked can_forward().
+        """
+        if not self._batch_queue:
+            self.enqueue_event(event_type, payload)
+            return
+
+        try:
+            self._batch_queue.put_nowait((event_type, payload))
+        except asyncio.QueueFull:
+            self._count_drop(event_type)
+
+    def _count_drop(self, event_type: str):
+        self._tx_dropped += 1
+        now = asyncio.get_running_loop().time()
+        if now - self._tx_drop_logged_at >= DROP_LOG_INTERVAL_SECONDS:
+            self._tx_drop_logged_at = now
+            logger.warning("Engine queue full, dropped %s (%d total)", event_type, self._tx_dropped)
+
+    def can_forward(self) -> bool:
+        """
+        True once setup_hook has started the forwarders and the circuit is closed.
+        Callers check this before building a payload that would only be dropped.
+        """
+        return self._tx_queue is not None and not self._circuit_open()
+
+    def _circuit_open(self) -> bool:
+        return asyncio.get_running_loop().time() < self._cb_open_until
 
-        # Wrap in a task to ensure we don't block the Gateway event loop waiting for the Engine
-        asyncio.create_task(self._post_to_engine(event_type, payload, headers))
+    async def _tx_worker(self, queue: asyncio.Queue):
+        while True:
+            event_type, payload = await queue.get()
+            try:
+                await self._post_to_engine(event_type, payload)
+            except Exception as e:
+                # One bad event must never take a worker out of the pool
+                logger.error("Engine worker failed on %s: %s", event_type, e)
+            finally:
+                queue.task_done()
+
+    async def _batch_worker(self):
+        queue = self._batch_queue
+
+        while True:
+            # Block until there is something to send, then linger once to collect more.
+            # Items are drained with get_nowait so a burst costs no Task/timer per message.
+            event_type, payload = await queue.get()
+            events = [{"type": event_type, "payload": payload}]
+            self._drain_batch(events)
+
+            if len(events) < BATCH_MAX_EVENTS:
+                await asyncio.sleep(BATCH_LINGER_SECONDS)
+                self._drain_batch(events)
+
+            self.forward_event("batch", {"events": events})
 
-    async def _post_to_engine(self, event_type: str, payload: dict, headers: dict):
-        url = f"{config.ENGINE_URL}/ingress/{event_type}"
+    def _drain_batch(self, events: list):
+        queue = self._batch_queue
+        while len(events) < BATCH_MAX_EVENTS:
+            try:
+                event_type, payload = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            events.append({"type": event_type, "payload": payload})
+
+    async def _post_to_engine(self, event_type: str, payload):
+        url = self._ingress_urls[event_type]
         max_retries = 3
+        max_delay = 30
+
+        # Serialize once up front so retries resend the same bytes
+        try:
+            body = self._encode(payload)
+        except Exception as e:
+            logger.error("Failed to serialize %s for Engine: %s", event_type, e)
+            return
+        headers = self._headers
         
         for attempt in range(1, max_retries + 1):
             try:
-                async with self.http_session.post(url, json=payload, headers=headers) as resp:
-                    if resp.status >= 400:
-                        logger.error(f"Engine Error {resp.status}: {await resp.text()}")
-                    return # Exit on successful request or valid HTTP response
-            except aiohttp.ClientError as e:
-                logger.warning(f"Network hiccup to Engine (attempt {attempt}/{max_retries}): {e}")
-                if attempt == max_retries:
-                    logger.error(f"Failed to forward {event_type} to Engine after {max_retries} attempts.")
-                else:
-                    await asyncio.sleep(2 ** attempt) # Exponential backoff: 2s, 4s, 8s
+                resp = await self.http_session.post(url, data=body, headers=headers)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.warning("Network hiccup to Engine (attempt %d/%d): %s", attempt, max_retries, e)
             except Exception as e:
-                logger.error(f"Unexpected error forwarding to Engine: {e}")
+                logger.error("Unexpected error forwarding to Engine: %s", e)
                 return
+            else:
+                status = resp.status
+                # The body is only needed for error logging; release hands the connection straight back
+                if status >= 400 and logger.isEnabledFor(logging.ERROR):
+                    try:
+                        logger.error("Engine Error %s: %s", status, await resp.text())
+                    except (aiohttp.ClientError, asyncio.TimeoutError):
+                        logger.error("Engine Error %s", status)
+                    finally:
+                        resp.release()
+                else:
+                    resp.release()
+
+                # An overloaded Engine answers 429/5xx instead of refusing connections,
+                # so those count as failed attempts; anything else is a healthy Engine
+                if status < 500 and status != 429:
+                    self._cb_failures = 0
+                    return
+
+            if attempt == max_retries:
+                logger.error("Failed to forward %s to Engine after %d attempts.", event_type, max_retries)
+                self._cb_failures += 1
+                if self._cb_failures >= CIRCUIT_FAILURE_THRESHOLD:
+                    self._cb_open_until = asyncio.get_running_loop().time() + CIRCUIT_COOLDOWN_SECONDS
+                    logger.error("Engine unreachable, dropping events for %ss", CIRCUIT_COOLDOWN_SECONDS)
+            else:
+                # Full jitter so concurrent retries don't hit a recovering Engine in lockstep
+                await asyncio.sleep(random.uniform(0, min(2 ** attempt, max_delay)))
 
 client = GatewayBot()
 
@@ -87,86 +313,123 @@ async def proxy_command(interaction: discord.Interaction, command_name: str, eph
         if not interaction.response.is_done():
             await interaction.response.defer(ephemeral=ephemeral)
     except discord.NotFound:
-        logger.warning(f"Cmd {command_name}: Interaction timed out before defer (Gateway Lag)")
+        logger.warning("Cmd %s: Interaction timed out before defer (Gateway Lag)", command_name)
         return
     except Exception as e:
-        logger.error(f"Cmd {command_name}: Defer failed: {e}")
+        logger.error("Cmd %s: Defer failed: %s", command_name, e)
         return
 
     # 2. Build Payload
-    payload = {
-        "command": command_name,
-        "context": {
-            "guild_id": str(interaction.guild.id) if interaction.guild else None,
-            "channel_id": str(interaction.channel_id),
-            "user_id": str(interaction.user.id),
-            "user_name": interaction.user.name,
-            "interaction_token": interaction.token,
-            "application_id": str(interaction.application_id)
-        },
-        "params": {}
-    }
+    if not client.can_forward():
+        return
+
+    guild = interaction.guild
+    user = interaction.user
+    context = CommandContext(
+        guild_id=guild.id if guild else None,
+        channel_id=interaction.channel_id,
+        user_id=user.id,
+        user_name=user.name,
+        interaction_token=interaction.token,
+        application_id=interaction.application_id
+    )
 
     # 3. Serialize Params
+    params = {}
     for k, v in kwargs.items():
         if isinstance(v, (discord.User, discord.Member)):
-            payload["params"][k] = str(v.id)
+            params[k] = v.id
         else:
-            payload["params"][k] = v
+            params[k] = v
+
+    payload = CommandPayload(command=command_name, context=context, params=params)
 
     # 4. Forward
-    await client.forward_event("command", payload)
+    client.enqueue_event("command", payload)
 
 # --- FORWARDING LOGIC (EVENTS) ---
 
-@client.event
-async def on_message(message):
-    if message.author.bot:
+def _forward_raw_message(data: dict):
+    """
+    Replaces discord.py's MESSAGE_CREATE parser: filters and forwards straight from the
+    gateway dict without building Message/Member/Channel objects. on_message never fires.
+    """
+    # Cheapest check first: most non-forwardable traffic (embeds, attachments, system) has no content
+    content = data.get("content")
+    if not content:
         return
 
-    if not message.content:
-        return
+    # This runs inside discord.py's websocket reader, not a dispatched task: an exception
+    # here would tear down the gateway connection, so a malformed event is logged and dropped
+    try:
+        author = data["author"]
+        if author.get("bot"):
+            return
+
+        if not client.can_forward():
+            return
+
+        guild_id = data.get("guild_id")
+        payload = MessagePayload(
+            guild_id=int(guild_id) if guild_id else None,
+            channel_id=int(data["channel_id"]),
+            user_id=int(author["id"]),
+            user_name=author["username"],
+            content=content,
+            message_id=int(data["id"])
+        )
+
+        client.enqueue_batched("message", payload)
+    except Exception as e:
+        logger.error("Dropped malformed MESSAGE_CREATE: %r", e)
 
-    payload = {
-        "guild_id": str(message.guild.id) if message.guild else None,
-        "channel_id": str(message.channel.id),
-        "user_id": str(message.author.id),
-        "user_name": message.author.name,
-        "content": message.content,
-        "message_id": str(message.id)
-    }
+def _ignore_event(data: dict):
+    pass
 
-    await client.forward_event("message", payload)
+_parsers = client._connection.parsers
+_parsers["MESSAGE_CREATE"] = _forward_raw_message
+for _event in IGNORED_GATEWAY_EVENTS:
+    _parsers[_event] = _ignore_event
 
 @client.event
 async def on_interaction(interaction: discord.Interaction):
     if interaction.type == discord.InteractionType.component:
         
-        custom_id = interaction.data.get("custom_id")
+        data = interaction.data
+        custom_id = data.get("custom_id")
+
+        # Stale or foreign buttons: skip the defer call and the Engine POST entirely
+        if COMPONENT_ID_PREFIXES and not (custom_id and custom_id.startswith(COMPONENT_ID_PREFIXES)):
+            return
+
         is_ephemeral = (custom_id == "start_btn")
         
         try:
             await interaction.response.defer(ephemeral=is_ephemeral)
         except discord.NotFound:
-            logger.warning(f"Interaction {custom_id}: Timed out before defer")
+            logger.warning("Interaction %s: Timed out before defer", custom_id)
             return
         except Exception as e:
-            logger.error(f"Interaction {custom_id}: Error {e}")
+            logger.error("Interaction %s: Error %s", custom_id, e)
             return
+
+        if not client.can_forward():
+            return
+
+        guild = interaction.guild
+        user = interaction.user
+        payload = InteractionPayload(
+            custom_id=custom_id,
+            guild_id=guild.id if guild else None,
+            channel_id=interaction.channel_id,
+            user_id=user.id,
+            user_name=user.name,
+            values=data.get("values", []),
+            interaction_token=interaction.token,
+            application_id=interaction.application_id
+        )
         
-        payload = {
-            "type": "component",
-            "custom_id": custom_id,
-            "guild_id": str(interaction.guild.id) if interaction.guild else None,
-            "channel_id": str(interaction.channel_id),
-            "user_id": str(interaction.user.id),
-            "user_name": interaction.user.name,
-            "values": interaction.data.get("values", []),
-            "interaction_token": interaction.token,
-            "application_id": str(interaction.application_id)
-        }
-        
-        await client.forward_event("interaction", payload)
+        client.enqueue_event("interaction", payload)
 
 # --- COMMAND DEFINITIONS ---
 
@@ -176,18 +439,25 @@ cscratch_group = app_commands.Group(name="cscratch", description="Manage cscratc
 async def lobby(interaction: discord.Interaction, cartridge: str = "foster-protocol"):
     await proxy_command(interaction, "lobby", cartridge=cartridge)
 
-@cscratch_group.command(name="kill", description="End and delete the current game")
-async def kill(interaction: discord.Interaction):
-    await proxy_command(interaction, "kill")
+def _make_forwarder(command_name: str, ephemeral: bool = False):
+    """
+    Build a no-argument slash command callback that goes straight to proxy_command.
+    """
+    async def callback(interaction: discord.Interaction):
+        await proxy_command(interaction, command_name, ephemeral=ephemeral)
 
-@cscratch_group.command(name="balance", description="Check your scratch balance (Private)")
-async def balance_cmd(interaction: discord.Interaction):
-    await proxy_command(interaction, "balance", ephemeral=True)
+    callback.__name__ = f"{command_name}_cmd"
+    callback.__qualname__ = callback.__name__
+    return callback
 
-@cscratch_group.command(name="guide", description="Read a getting started guide")
-async def guide_cmd(interaction: discord.Interaction):
-    await proxy_command(interaction, "guide")
+# (name, description, ephemeral) for commands that take no options.
+# Commands with options keep an explicit def so discord.py can read their signature.
+SIMPLE_COMMANDS = (
+    ("kill", "End and delete the current game", False),
+    ("balance", "Check your scratch balance (Private)", True),
+    ("guide", "Read a getting started guide", False),
+    ("manual", "Read a manual covering all game mechanics", False),
+)
 
-@cscratch_group.command(name="manual", description="Read a manual covering all game mechanics")
-async def manual_cmd(interaction: discord.Interaction):
-    await proxy_command(interaction, "manual")
\ No newline at end of file
+for _name, _description, _ephemeral in SIMPLE_COMMANDS:
+    cscratch_group.command(name=_name, description=_description)(_make_forwarder(_name, _ephemeral))
@@ -1,4 +1,5 @@
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from contextlib import asynccontextmanager
 import asyncio
 import logging
@@ -22,15 +23,16 @@ async def lifespan(app: FastAPI):
         try:
             await gateway.client.start(config.DISCORD_TOKEN)
         except Exception as e:
-            logger.critical(f"Discord gateway connection failed: {e}")
+            logger.critical("Discord gateway connection failed: %s", e)
         finally:
             # If the bot task exits for any reason, kill the container.
             # Cloud Run will automatically restart it.
             logger.critical("Bot task ended unexpectedly. Forcing container exit.")
             os._exit(1)
             
-    # Start the bot in the background with crash handling
-    asyncio.create_task(run_bot())
+    # Start the bot in the background with crash handling.
+    # Keep a reference on app.state: the loop only holds tasks weakly.
+    app.state.bot_task = asyncio.create_task(run_bot())
     
     yield
     
@@ -38,12 +40,16 @@ async def lifespan(app: FastAPI):
     logger.info("Stopping Gateway Bot...")
     await gateway.client.close()
 
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+
+# Healthcheck bodies are constant, so build both once
+PING_CONNECTED = {"status": "ok", "bot_connected": True}
+PING_DISCONNECTED = {"status": "ok", "bot_connected": False}
 
 @app.get("/ping")
 async def ping():
-    return {"status": "ok", "bot_connected": gateway.client.is_ready()}
+    return PING_CONNECTED if gateway.client.gateway_connected else PING_DISCONNECTED
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8080)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8080, loop="uvloop", http="httptools", access_log=False)
\ No newline at end of file
@@ -0,0 +1,50 @@
+from dataclasses import dataclass
+
+# Slotted payloads for Engine POSTs. orjson serializes dataclasses natively;
+# msgpack needs asdict as its default hook (see GatewayBot.setup_hook).
+
+@dataclass(slots=True)
+class CommandContext:
+    guild_id: int | None
+    channel_id: int
+    user_id: int
+    user_name: str
+    interaction_token: str
+    application_id: int
+
+@dataclass(slots=True)
+class CommandPayload:
+    command: str
+    context: CommandContext
+    params: dict
+
+@dataclass(slots=True)
+class MessagePayload:
+    guild_id: int | None
+    channel_id: int
+    user_id: int
+    user_name: str
+    content: str
+    message_id: int
+
+@dataclass(slots=True)
+class InteractionPayload:
+    custom_id: str
+    guild_id: int | None
+    channel_id: int
+    user_id: int
+    user_name: str
+    values: list
+    interaction_token: str
+    application_id: int
+    type: str = "component"
+
+def to_dict(obj):
+    """
+    msgpack `default` hook: expand a payload dataclass one level into a plain dict.
+    msgpack calls the hook again for nested dataclasses, so no recursive asdict/deepcopy.
+    """
+    try:
+        return {name: getattr(obj, name) for name in obj.__slots__}
+    except AttributeError:
+        raise TypeError(f"Cannot serialize {type(obj).__name__}") from None